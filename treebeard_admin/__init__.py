@@ -1 +1,3 @@
 __version__ = '1.0a3'
+
+default_app_config = 'treebeard_admin.apps.TreebeardAdminConfig'
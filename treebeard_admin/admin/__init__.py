@@ -2,10 +2,12 @@ from __future__ import unicode_literals
 
 from .admin import TreeAdmin
 from .forms import TreeAdminForm, movenodeform_factory
+from .nodes import NodeIdentityMap
 
 
 __all__ = [
     TreeAdmin,
     TreeAdminForm,
+    NodeIdentityMap,
     movenodeform_factory
 ]
@@ -0,0 +1,377 @@
+from __future__ import unicode_literals
+
+from bisect import bisect_left
+
+from django import forms
+from django.contrib import messages
+from django.contrib.admin import helpers
+from django.contrib.admin.utils import model_ngettext
+from django.core.exceptions import PermissionDenied
+from django.db import router, transaction
+from django.db.models import Q
+from django.template.response import TemplateResponse
+from django.utils.translation import ugettext_lazy as _
+
+from ..duplicate import duplicate_subtree
+from .forms import TreeAdminForm
+
+
+class MoveSelectedForm(forms.Form):
+    _parent_id = forms.TypedChoiceField(
+        coerce=int,
+        label=_('Parent node'),
+    )
+    _position = forms.ChoiceField(
+        choices=TreeAdminForm._position_choices,
+        initial=TreeAdminForm._position_choices[0][0],
+        label=_('Position'),
+    )
+
+    def __init__(self, model, *args, **kwargs):
+        super(MoveSelectedForm, self).__init__(*args, **kwargs)
+        self.fields['_parent_id'].choices = TreeAdminForm.mk_dropdown_tree(
+            model
+        )
+
+
+class SortSelectedForm(forms.Form):
+    field = forms.ChoiceField(label=_('Sort by'))
+    descending = forms.BooleanField(label=_('Descending'), required=False)
+
+    def __init__(self, fields, *args, **kwargs):
+        super(SortSelectedForm, self).__init__(*args, **kwargs)
+        self.fields['field'].choices = fields
+
+
+def get_topmost_nodes(nodes):
+    """
+    Drop the nodes whose ancestor is part of nodes as well, the result keeps
+    the tree order.
+    """
+    nodes = sorted(nodes, key=_tree_order)
+    topmost = []
+    for node in nodes:
+        if not any(_contains(parent, node) for parent in topmost[-1:]):
+            topmost.append(node)
+    return topmost
+
+
+def get_subtrees_queryset(model, nodes):
+    """
+    Return a queryset of the given nodes and all their descendants.
+    """
+    q = Q(pk__in=[node.pk for node in nodes])
+    for node in nodes:
+        if hasattr(node, 'path'):
+            q |= Q(path__startswith=node.path)
+        else:
+            q |= Q(tree_id=node.tree_id, lft__gt=node.lft, lft__lt=node.rgt)
+    return model._default_manager.filter(q)
+
+
+def _tree_order(node):
+    if hasattr(node, 'path'):
+        return (node.path,)
+    return (node.tree_id, node.lft)
+
+
+def _contains(parent, node):
+    if hasattr(parent, 'path'):
+        return node.path.startswith(parent.path)
+    return (
+        parent.tree_id == node.tree_id and parent.lft < node.lft < parent.rgt
+    )
+
+
+def _longest_increasing_subsequence(seq):
+    """
+    Return the indexes of one longest increasing subsequence of seq.
+    """
+    tails = []
+    tail_indexes = []
+    previous = [None] * len(seq)
+    for i, value in enumerate(seq):
+        pos = bisect_left(tails, value)
+        if pos:
+            previous[i] = tail_indexes[pos - 1]
+        if pos == len(tails):
+            tails.append(value)
+            tail_indexes.append(i)
+        else:
+            tails[pos] = value
+            tail_indexes[pos] = i
+    indexes = set()
+    i = tail_indexes[-1] if tail_indexes else None
+    while i is not None:
+        indexes.add(i)
+        i = previous[i]
+    return indexes
+
+
+def _render_action(modeladmin, request, queryset, action, title, form=None,
+                   extra_context=None):
+    opts = modeladmin.model._meta
+    context = dict(
+        modeladmin.admin_site.each_context(request),
+        title=title,
+        objects_name=model_ngettext(queryset),
+        queryset=queryset,
+        nodes=queryset,
+        form=form,
+        action=action,
+        opts=opts,
+        parent_node=modeladmin._node,
+        action_checkbox_name=helpers.ACTION_CHECKBOX_NAME,
+        media=modeladmin.media,
+    )
+    context.update(extra_context or {})
+    request.current_app = modeladmin.admin_site.name
+    return TemplateResponse(request, [
+        'admin/{}/{}/tree_action.html'.format(opts.app_label, opts.model_name),
+        'admin/{}/tree_action.html'.format(opts.app_label),
+        'admin/treebeard_admin/tree_action.html',
+    ], context)
+
+
+def _reload(model, node):
+    return model._default_manager.get(pk=node.pk)
+
+
+def move_selected(modeladmin, request, queryset):
+    """
+    Move the selected nodes with their subtrees under a new parent.
+    The nodes are appended in tree order, nodes within a selected subtree
+    travel with it.
+    """
+    model = modeladmin.model
+    form = MoveSelectedForm(
+        model,
+        request.POST if request.POST.get('post') else None,
+        initial={'_parent_id': getattr(modeladmin._node, 'pk', 0)},
+    )
+    if not form.is_valid():
+        return _render_action(
+            modeladmin, request, queryset, 'move_selected',
+            _('Move selected nodes'), form=form,
+        )
+    parent_id = form.cleaned_data['_parent_id']
+    position = form.cleaned_data['_position']
+    nodes = get_topmost_nodes(queryset)
+    parent = None
+    if parent_id:
+        try:
+            parent = model._default_manager.get(pk=parent_id)
+        except model.DoesNotExist:
+            modeladmin.message_user(
+                request,
+                _('The selected parent node does not exist anymore.'),
+                messages.ERROR,
+            )
+            return None
+        if any(node == parent or _contains(node, parent) for node in nodes):
+            modeladmin.message_user(
+                request,
+                _('A node can not be moved into its own subtree.'),
+                messages.ERROR,
+            )
+            return None
+    nodes = [
+        node for node in nodes if parent_id != getattr(
+            modeladmin._get_parent(request, node), 'pk', 0
+        )
+    ]
+    # appending keeps the already moved siblings in place, prepending is
+    # done in reverse to get the same order
+    if position == 'first-child':
+        nodes.reverse()
+    with transaction.atomic(using=router.db_for_write(model)):
+        for node in nodes:
+            node = _reload(model, node)
+            if parent is None:
+                target = model.get_first_root_node()
+                pos = position.replace('child', 'sibling')
+            else:
+                target = _reload(model, parent)
+                pos = position
+            node.move(target, pos=pos)
+            modeladmin.log_change(request, node, [{'changed': {
+                'fields': ['_parent_id'],
+            }}])
+    modeladmin.tree_changed(request)
+    modeladmin.message_user(
+        request,
+        _('Successfully moved %(count)d %(items)s.') % {
+            'count': len(nodes),
+            'items': model_ngettext(modeladmin.opts, len(nodes)),
+        },
+        messages.SUCCESS,
+    )
+    return None
+
+
+move_selected.allowed_permissions = ('change',)
+move_selected.short_description = _('Move selected %(verbose_name_plural)s')
+
+
+def sort_selected(modeladmin, request, queryset):
+    """
+    Sort the selected siblings by a field. Only the nodes outside of the
+    longest already sorted run are moved.
+    """
+    model = modeladmin.model
+    form = SortSelectedForm(
+        modeladmin.get_tree_sort_fields(request),
+        request.POST if request.POST.get('post') else None,
+    )
+    if not form.is_valid():
+        return _render_action(
+            modeladmin, request, queryset, 'sort_selected',
+            _('Sort selected nodes'), form=form,
+        )
+    field = form.cleaned_data['field']
+    nodes = sorted(queryset, key=_tree_order)
+    parents = set(
+        getattr(modeladmin._get_parent(request, node), 'pk', None)
+        for node in nodes
+    )
+    if len(parents) > 1:
+        modeladmin.message_user(
+            request,
+            _('Only nodes with the same parent can be sorted.'),
+            messages.ERROR,
+        )
+        return None
+
+    def key(node):
+        value = getattr(node, field)
+        return (value is None, value)
+
+    wanted = sorted(
+        nodes,
+        key=key,
+        reverse=form.cleaned_data['descending'],
+    )
+    rank = dict((node.pk, i) for i, node in enumerate(wanted))
+    in_place = _longest_increasing_subsequence(
+        [rank[node.pk] for node in nodes]
+    )
+    keep = set(nodes[i].pk for i in in_place)
+    anchor = next((node for node in wanted if node.pk in keep), None)
+    moved = 0
+    with transaction.atomic(using=router.db_for_write(model)):
+        previous = None
+        for node in wanted:
+            if node.pk not in keep:
+                if previous is None:
+                    target, pos = anchor, 'left'
+                else:
+                    target, pos = previous, 'right'
+                _reload(model, node).move(_reload(model, target), pos=pos)
+                moved += 1
+            previous = node
+    modeladmin.tree_changed(request)
+    modeladmin.message_user(
+        request,
+        _('Successfully sorted %(count)d %(items)s, %(moved)d moved.') % {
+            'count': len(nodes),
+            'items': model_ngettext(modeladmin.opts, len(nodes)),
+            'moved': moved,
+        },
+        messages.SUCCESS,
+    )
+    return None
+
+
+sort_selected.allowed_permissions = ('change',)
+sort_selected.short_description = _('Sort selected %(verbose_name_plural)s')
+
+
+def duplicate_selected(modeladmin, request, queryset):
+    """
+    Copy the selected nodes with their subtrees to the end of their parent.
+    """
+    nodes = get_topmost_nodes(queryset)
+    with transaction.atomic(using=router.db_for_write(modeladmin.model)):
+        for node in nodes:
+            copy = duplicate_subtree(
+                node,
+                modeladmin._get_parent(request, node),
+                copy_node=lambda source, copy: modeladmin.duplicate_node(
+                    request, source, copy
+                ),
+                copy_related=lambda pairs: modeladmin.duplicate_related(
+                    request, pairs
+                ),
+            )
+            modeladmin.log_addition(request, copy, [{'added': {}}])
+    modeladmin.tree_changed(request)
+    modeladmin.message_user(
+        request,
+        _('Successfully duplicated %(count)d %(items)s.') % {
+            'count': len(nodes),
+            'items': model_ngettext(modeladmin.opts, len(nodes)),
+        },
+        messages.SUCCESS,
+    )
+    return None
+
+
+duplicate_selected.allowed_permissions = ('add',)
+duplicate_selected.short_description = _(
+    'Duplicate selected %(verbose_name_plural)s'
+)
+
+
+def delete_selected_subtrees(modeladmin, request, queryset):
+    """
+    Delete the selected nodes with their subtrees in one transaction.
+    Replaces the default delete_selected action which does not know about
+    the descendants, related objects of the whole subtrees are collected
+    and checked the same way.
+    """
+    model = modeladmin.model
+    nodes = get_topmost_nodes(queryset)
+    subtrees = get_subtrees_queryset(model, nodes)
+    deletable_objects, model_count, perms_needed, protected = (
+        modeladmin.get_deleted_objects(subtrees, request)
+    )
+    if request.POST.get('post') and not protected:
+        if perms_needed:
+            raise PermissionDenied
+        for node in nodes:
+            modeladmin.log_deletion(request, node, str(node))
+        modeladmin.delete_queryset(
+            request,
+            model._default_manager.filter(pk__in=[node.pk for node in nodes]),
+        )
+        modeladmin.message_user(
+            request,
+            _('Successfully deleted %(count)d %(items)s.') % {
+                'count': len(nodes),
+                'items': model_ngettext(modeladmin.opts, len(nodes)),
+            },
+            messages.SUCCESS,
+        )
+        return None
+    if perms_needed or protected:
+        title = _('Cannot delete %(name)s') % {
+            'name': model_ngettext(queryset),
+        }
+    else:
+        title = _('Are you sure?')
+    return _render_action(
+        modeladmin, request, queryset, 'delete_selected_subtrees', title,
+        extra_context={
+            'nodes': nodes,
+            'descendants_count': subtrees.count() - len(nodes),
+            'model_count': dict(model_count).items(),
+            'perms_lacking': perms_needed,
+            'protected': protected,
+        },
+    )
+
+
+delete_selected_subtrees.allowed_permissions = ('delete',)
+delete_selected_subtrees.short_description = _(
+    'Delete selected %(verbose_name_plural)s'
+)
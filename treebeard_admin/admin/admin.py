@@ -12,6 +12,8 @@ from django.conf.urls import url
 from django.contrib import admin, messages
 from django.contrib.admin.options import IS_POPUP_VAR, TO_FIELD_VAR
 from django.contrib.admin.templatetags.admin_urls import add_preserved_filters
+from django.core.exceptions import ValidationError
+from django.db import router, transaction
 from django.utils.html import format_html
 from django.http import (
     Http404,
@@ -27,13 +29,34 @@ from django.urls import reverse
 from django.utils.html import mark_safe
 from django.utils.translation import ugettext_lazy as _
 
+from ..models import bump_tree_version
+from ..routers import (
+    get_read_alias,
+    is_replica_current,
+    pin_version,
+    tree_reads,
+)
+from .actions import (
+    delete_selected_subtrees,
+    duplicate_selected,
+    move_selected,
+    sort_selected,
+)
+from .nodes import get_identity_map
+
 
 class TreeAdmin(admin.ModelAdmin):
 
     _node = None
 
-    actions = None
+    actions = [
+        move_selected,
+        sort_selected,
+        duplicate_selected,
+        delete_selected_subtrees,
+    ]
     max_depth = None  # TODO implement that the max_depth gets to the form
+    read_database = None  # defaults to TREEBEARD_ADMIN_READ_DATABASE
     change_list_template = 'admin/treebeard_admin/tree_list.html'
     change_form_template = 'admin/treebeard_admin/tree_form.html'
     delete_confirmation_template = 'admin/treebeard_admin/tree_delete.html'
@@ -109,6 +132,84 @@ class TreeAdmin(admin.ModelAdmin):
     def get_list_display_links(self, request, list_display):
         return None
 
+    def get_actions(self, request):
+        actions = super(TreeAdmin, self).get_actions(request)
+        # replaced by delete_selected_subtrees
+        actions.pop('delete_selected', None)
+        if self.model.node_order_by:
+            # copies are appended which breaks the sort order
+            actions.pop('duplicate_selected', None)
+        return actions
+
+    def get_tree_sort_fields(self, request):
+        """
+        Fields offered by the sort action, all concrete fields except the
+        ones managed by treebeard
+        """
+        tree_fields = (
+            'path', 'depth', 'numchild', 'lft', 'rgt', 'tree_id',
+            'parent', 'sib_order',
+        )
+        return [
+            (f.attname, f.verbose_name)
+            for f in self.model._meta.concrete_fields
+            if not f.primary_key and f.name not in tree_fields
+        ]
+
+    def save_model(self, request, obj, form, change):
+        super(TreeAdmin, self).save_model(request, obj, form, change)
+        self.tree_changed(request)
+
+    def delete_model(self, request, obj):
+        super(TreeAdmin, self).delete_model(request, obj)
+        self.tree_changed(request)
+
+    def delete_queryset(self, request, queryset):
+        """
+        Delete the given nodes with their subtrees in one transaction
+        """
+        with transaction.atomic(using=router.db_for_write(self.model)):
+            queryset.delete()
+        self.tree_changed(request)
+
+    def duplicate_node(self, request, source, copy):
+        """
+        Hook to change the copy of source before it is inserted by the
+        duplicate action
+        """
+        pass
+
+    def duplicate_related(self, request, pairs):
+        """
+        Hook to copy or remap related objects, gets every inserted chunk of
+        the duplicate action as a list of (source, copy)
+        """
+        pass
+
+    def get_read_database(self, request):
+        """
+        Database alias for the tree reads of request, ``None`` keeps the
+        default routing. Only GET and HEAD requests are sent to the replica
+        and only once it has the last tree change made by the user.
+        """
+        using = self.read_database or get_read_alias()
+        if not using or request.method not in ('GET', 'HEAD'):
+            return None
+        if not is_replica_current(request, self.model, using):
+            return None
+        return using
+
+    def tree_changed(self, request):
+        """
+        Called after every structural change of the tree
+        """
+        self.get_identity_map(request).clear()
+        callback = None
+        if self.read_database or get_read_alias():
+            def callback(version):
+                pin_version(request, self.model, version)
+        bump_tree_version(self.model, callback=callback)
+
     def get_queryset(self, request, fallback=False):
         """
         Only display nodes for the current node or with depth = 1 (root)
@@ -129,6 +230,13 @@ class TreeAdmin(admin.ModelAdmin):
         key is used if no field is provided. Returns ``None`` if no match is
         found or the object_id fails validation.
         """
+        if from_field is None:
+            nodes = self.get_identity_map(request)
+            qs = self.get_queryset(request, fallback=True)
+            try:
+                return nodes.get(object_id, queryset=qs)
+            except (self.model.DoesNotExist, ValidationError, ValueError):
+                return None
         obj = super(TreeAdmin, self).get_object(request, object_id, from_field)
         if obj is None:
             try:
@@ -138,24 +246,34 @@ class TreeAdmin(admin.ModelAdmin):
                 obj = None
         return obj
 
+    def get_identity_map(self, request):
+        """
+        Get the node identity map shared by the current request
+        """
+        return get_identity_map(request, self.model)
+
+    def get_form(self, request, obj=None, **kwargs):
+        form = super(TreeAdmin, self).get_form(request, obj, **kwargs)
+        form._nodes = self.get_identity_map(request)
+        return form
+
     def get_changeform_initial_data(self, request):
         data = super(TreeAdmin, self).get_changeform_initial_data(request)
         if self._node:
             data['_parent_id'] = self._node.id
         return data
 
-    def get_node(self, node_id):
+    def get_node(self, node_id, request=None):
         """
         Get the current root node
         """
         if node_id:
-            qs = self.model._default_manager.get_queryset()
             try:
                 id = int(node_id)
             except ValueError:
                 return None
             try:
-                return qs.get(pk=id)
+                return self._get_node(request, id)
             except self.model.DoesNotExist:
                 raise Http404(
                     '{} with id "{}" does not exist'.format(
@@ -165,13 +283,24 @@ class TreeAdmin(admin.ModelAdmin):
                 )
         return None
 
+    def _get_node(self, request, pk):
+        if request is not None:
+            return self.get_identity_map(request).get(pk)
+        return self.model._default_manager.get(pk=pk)
+
+    def _get_parent(self, request, node):
+        if request is not None:
+            return self.get_identity_map(request).get_parent(node)
+        return node.get_parent()
+
+    @tree_reads
     def add_view(self, request, node_id=None, form_url='', extra_context=None):
-        self._node = self.get_node(node_id)
+        self._node = self.get_node(node_id, request)
         extra_context = extra_context or {}
         extra_context.update({'parent_node': self._node})
         return super(TreeAdmin, self).add_view(
             request,
-            form_url=form_url or self.get_add_url(),
+            form_url=form_url or self.get_add_url(request=request),
             extra_context=extra_context
         )
 
@@ -200,10 +329,11 @@ class TreeAdmin(admin.ModelAdmin):
             post_url = reverse('admin:index', current_app=self.admin_site.name)
         return HttpResponseRedirect(post_url)
 
+    @tree_reads
     def change_view(self, request, object_id, form_url='', extra_context=None):
         obj = self.get_object(request, object_id)
         if obj:
-            self._node = obj.get_parent()
+            self._node = self._get_parent(request, obj)
         extra_context = extra_context or {}
         extra_context.update({'parent_node': self._node})
         return super(TreeAdmin, self).change_view(
@@ -294,7 +424,7 @@ class TreeAdmin(admin.ModelAdmin):
                 **msg_dict
             )
             self.message_user(request, msg, messages.SUCCESS)
-            redirect_url = self.get_add_url()
+            redirect_url = self.get_add_url(request=request)
             redirect_url = add_preserved_filters(
                 {'preserved_filters': preserved_filters, 'opts': opts},
                 redirect_url
@@ -321,9 +451,10 @@ class TreeAdmin(admin.ModelAdmin):
             post_url = reverse('admin:index', current_app=self.admin_site.name)
         return HttpResponseRedirect(post_url)
 
+    @tree_reads
     def delete_view(self, request, object_id, node_id=None,
                     extra_context=None):
-        self._node = self.get_node(node_id)
+        self._node = self.get_node(node_id, request)
         extra_context = extra_context or {}
         extra_context.update({'parent_node': self._node})
         return super(TreeAdmin, self).delete_view(
@@ -374,9 +505,10 @@ class TreeAdmin(admin.ModelAdmin):
             post_url = reverse('admin:index', current_app=self.admin_site.name)
         return HttpResponseRedirect(post_url)
 
+    @tree_reads
     def history_view(self, request, object_id, node_id=None,
                      extra_context=None):
-        self._node = self.get_node(node_id)
+        self._node = self.get_node(node_id, request)
         extra_context = extra_context or {}
         extra_context.update({'parent_node': self._node})
         return super(TreeAdmin, self).history_view(
@@ -385,12 +517,13 @@ class TreeAdmin(admin.ModelAdmin):
             extra_context
         )
 
+    @tree_reads
     def changelist_view(self, request, node_id=None, extra_context=None):
-        self._node = self.get_node(node_id)
+        self._node = self.get_node(node_id, request)
         extra_context = extra_context or {}
         extra_context.update({
             'parent_node': self._node,
-            'add_url': self.get_add_url(),
+            'add_url': self.get_add_url(request=request),
             'update_url': self.get_update_url(),
             'max_depth': self.max_depth or 0,
         })
@@ -399,14 +532,14 @@ class TreeAdmin(admin.ModelAdmin):
             extra_context,
         )
 
-    def get_add_url(self, object_id=None, instance=None):
+    def get_add_url(self, object_id=None, instance=None, request=None):
         # TODO this method needs proper error logging
         # if there is a reference obj (object_id, instance) use it to get
         # the parent node else check if there the path provides a parent
         if object_id and not instance:
-            instance = self.model._default_manager.get(pk=object_id)
+            instance = self._get_node(request, object_id)
         if instance:
-            parent = instance.get_parent()
+            parent = self._get_parent(request, instance)
             kwargs = {'node_id': parent.pk}
         elif self._node:
             kwargs = {'node_id': self._node.pk}
@@ -419,27 +552,16 @@ class TreeAdmin(admin.ModelAdmin):
             current_app=self.admin_site.name
         )
 
-    def get_change_url(self, object_id=None, instance=None):
+    def get_change_url(self, object_id=None, instance=None, request=None):
         # TODO this method needs proper error logging
-        # get the parent from the given obj (object_id, instance)
-        parent = None
+        # the change url does not carry the parent node while the nested
+        # change url is disabled in get_urls, so no parent is looked up
         opts = self.model._meta
         if object_id and not instance:
-            instance = self.model._default_manager.get(pk=object_id)
-        if instance:
-            parent = instance.get_parent()
-        if parent:
-            args = None
-            kwargs = {'object_id': instance.pk, 'node_id': parent.pk}
-        else:
-            kwargs = None
-            args = [instance.pk]
-        kwargs = None
-        args = [instance.pk]
+            instance = self._get_node(request, object_id)
         return reverse(
             'admin:{}_{}_change'.format(opts.app_label, opts.model_name),
-            args=args,
-            kwargs=kwargs,
+            args=[instance.pk],
             current_app=self.admin_site.name
         )
 
@@ -495,6 +617,7 @@ class TreeAdmin(admin.ModelAdmin):
                     node.move(target, pos='right')
             else:
                 node.move(target, pos=pos)
+            self.tree_changed(request)
             node = self.model.objects.get(pk=node.pk)
             node.save()
         else:
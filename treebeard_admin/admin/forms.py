@@ -14,6 +14,9 @@ class TreeAdminForm(forms.ModelForm):
 
     max_depth = None
 
+    # request scoped node identity map, set by TreeAdmin.get_form
+    _nodes = None
+
     _position_choices = (
         ('last-child', _('At the bottom')),
         ('first-child', _('At the top')),
@@ -37,7 +40,7 @@ class TreeAdminForm(forms.ModelForm):
             for_node=kwargs.get('instance', None)
         )
         if instance:
-            parent = instance.get_parent()
+            parent = self._get_parent_of(instance)
             if parent:
                 self.declared_fields['_parent_id'].initial = parent.pk
             else:
@@ -66,11 +69,21 @@ class TreeAdminForm(forms.ModelForm):
             return None
         model = self._meta.model
         try:
-            parent = self._meta.model.objects.get(pk=pk)
+            parent = self._get_node(pk)
         except model.DoesNotExist:
             return None
         return parent
 
+    def _get_node(self, pk):
+        if self._nodes is not None:
+            return self._nodes.get(pk)
+        return self._meta.model.objects.get(pk=pk)
+
+    def _get_parent_of(self, node):
+        if self._nodes is not None:
+            return self._nodes.get_parent(node)
+        return node.get_parent()
+
     def _get_creation_data(self):
         data = {}
         for field in self.cleaned_data:
@@ -89,20 +102,25 @@ class TreeAdminForm(forms.ModelForm):
             else:
                 self.instance = self._meta.model.add_root(**data)
                 if position == 'first-child':
-                    self.instance.move(parent, pos=position)
+                    self.instance.move(
+                        self._meta.model.get_first_root_node(),
+                        pos='first-sibling'
+                    )
         else:
-            parent = self.instance.get_parent()
+            parent = self._get_parent_of(self.instance)
             self.instance.save()
             # If the parent_id changed move the node to the new parent
             if not parent_id == getattr(parent, 'pk', 0):
                 try:
-                    new_parent = self._meta.model.objects.get(pk=parent_id)
+                    new_parent = self._get_node(parent_id)
                 except self._meta.model.DoesNotExist:
                     new_parent = self._meta.model.get_last_root_node()
                     position = 'right'
                 self.instance.move(new_parent, position)
 
         # Reload the instance
+        if self._nodes is not None:
+            self._nodes.clear()
         self.instance = self._meta.model.objects.get(pk=self.instance.pk)
         super(TreeAdminForm, self).save(commit=commit)
         return self.instance
@@ -0,0 +1,108 @@
+from __future__ import unicode_literals
+
+from django.core.exceptions import ValidationError
+
+
+class NodeIdentityMap(object):
+    """
+    Holds every node loaded during a single request, so each node and each
+    parent is fetched at most once. ``hits`` and ``misses`` count the
+    lookups answered from the map and from the database.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.hits = 0
+        self.misses = 0
+        self._nodes = {}
+        self._parents = {}
+        # pks loaded through a queryset passed to get
+        self._scoped = set()
+
+    def _key(self, pk):
+        try:
+            return self.model._meta.pk.to_python(pk)
+        except (TypeError, ValueError, ValidationError):
+            return None
+
+    def _get_queryset(self):
+        return self.model._default_manager.get_queryset()
+
+    def add(self, node):
+        """
+        Put a node loaded elsewhere into the map and return the instance the
+        map holds for its pk.
+        """
+        return self._nodes.setdefault(node.pk, node)
+
+    def get(self, pk, queryset=None):
+        """
+        Return the node for pk, loading it on the first access. Raises
+        ``model.DoesNotExist`` like ``QuerySet.get``. With a queryset the
+        node is only answered from the map once it has been loaded through
+        a queryset, so rows the queryset hides are never returned.
+        """
+        key = self._key(pk)
+        if key is None:
+            raise self.model.DoesNotExist
+        if key in self._nodes and (queryset is None or key in self._scoped):
+            self.hits += 1
+            return self._nodes[key]
+        self.misses += 1
+        if queryset is None:
+            return self.add(self._get_queryset().get(pk=key))
+        node = self.add(queryset.get(pk=key))
+        self._scoped.add(key)
+        return node
+
+    def get_parent(self, node):
+        """
+        Return the parent of node (``None`` for root nodes), loading it on
+        the first access.
+        """
+        if node.pk in self._parents:
+            self.hits += 1
+            parent_pk = self._parents[node.pk]
+            return None if parent_pk is None else self._nodes[parent_pk]
+        self.misses += 1
+        parent = node.get_parent()
+        if parent is None:
+            self._parents[node.pk] = None
+            return None
+        parent = self.add(parent)
+        self._parents[node.pk] = parent.pk
+        return parent
+
+    def clear(self):
+        """
+        Forget all nodes, call this after the tree has been restructured.
+        The counters are kept.
+        """
+        self._nodes.clear()
+        self._parents.clear()
+        self._scoped.clear()
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'nodes': len(self._nodes),
+        }
+
+
+def get_identity_map(request, model):
+    """
+    Return the identity map for model bound to request, create it on the
+    first call.
+    """
+    maps = getattr(request, '_treebeard_admin_nodes', None)
+    if maps is None:
+        maps = {}
+        try:
+            request._treebeard_admin_nodes = maps
+        except AttributeError:
+            return NodeIdentityMap(model)
+    key = model._meta.label_lower
+    if key not in maps:
+        maps[key] = NodeIdentityMap(model)
+    return maps[key]
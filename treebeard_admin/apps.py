@@ -0,0 +1,15 @@
+from __future__ import unicode_literals
+
+from django.apps import AppConfig
+from django.core import checks
+from django.utils.translation import ugettext_lazy as _
+
+
+class TreebeardAdminConfig(AppConfig):
+    name = 'treebeard_admin'
+    verbose_name = _('Treebeard Admin')
+
+    def ready(self):
+        from .checks import check_read_database, check_tree_indexes
+        checks.register(check_tree_indexes, checks.Tags.models)
+        checks.register(check_read_database, checks.Tags.admin)
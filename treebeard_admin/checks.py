@@ -0,0 +1,159 @@
+from __future__ import unicode_literals
+
+from django.contrib.admin.sites import all_sites
+from django.core import checks
+from django.db import models, router
+
+from treebeard.al_tree import AL_Node
+from treebeard.mp_tree import MP_Node
+from treebeard.ns_tree import NS_Node
+
+from .routers import TreeAdminRouter, get_read_alias
+
+
+def get_index_requirements(model):
+    """
+    Returns the ``(fields, reason)`` indexes the TreeAdmin queries of model
+    rely on.
+    """
+    if issubclass(model, MP_Node):
+        return [
+            (['depth', 'path'], 'root and children changelists'),
+            (['path'], 'ordered tree scans and sibling ranges'),
+        ]
+    if issubclass(model, NS_Node):
+        return [
+            (['tree_id', 'lft'], 'ordered tree scans and children'),
+            (['tree_id', 'rgt'], 'interval updates of moves'),
+            (['depth', 'tree_id', 'lft'], 'root changelists'),
+        ]
+    if issubclass(model, AL_Node) and not model.node_order_by:
+        return [
+            (['parent', 'sib_order'], 'ordered children and sibling moves'),
+        ]
+    return []
+
+
+def get_declared_indexes(model):
+    """
+    Returns the field lists of every index declared on model.
+    """
+    opts = model._meta
+    # the order of descending fields does not matter for the lookups
+    indexes = [
+        [field.lstrip('-') for field in index.fields]
+        for index in opts.indexes
+    ]
+    indexes += [list(fields) for fields in opts.index_together]
+    indexes += [list(fields) for fields in opts.unique_together]
+    for field in opts.concrete_fields:
+        if field.db_index or field.unique:
+            indexes.append([field.name])
+    return indexes
+
+
+def get_missing_indexes(model):
+    """
+    Returns the ``(fields, reason)`` requirements not covered by the leading
+    fields of a declared index.
+    """
+    indexes = get_declared_indexes(model)
+    return [
+        (fields, reason)
+        for fields, reason in get_index_requirements(model)
+        if not any(index[:len(fields)] == fields for index in indexes)
+    ]
+
+
+def get_index_name(model, fields):
+    """
+    Returns the name Django generates for an index of fields on model, it
+    is unique across apps and fits every backend.
+    """
+    index = models.Index(fields=fields)
+    index.set_name_with_model(model)
+    return index.name
+
+
+def get_add_index_operation(model, fields):
+    return (
+        "migrations.AddIndex(model_name='{}', index=models.Index("
+        "fields={!r}, name='{}'))".format(
+            model._meta.model_name,
+            [str(f) for f in fields],
+            get_index_name(model, fields),
+        )
+    )
+
+
+def get_tree_admins():
+    from .admin import TreeAdmin
+    admins = []
+    for site in all_sites:
+        for model_admin in site._registry.values():
+            if isinstance(model_admin, TreeAdmin):
+                admins.append(model_admin)
+    return admins
+
+
+def get_tree_admin_models():
+    tree_models = []
+    for model_admin in get_tree_admins():
+        if model_admin.model not in tree_models:
+            tree_models.append(model_admin.model)
+    return tree_models
+
+
+def has_tree_router():
+    return any(isinstance(r, TreeAdminRouter) for r in router.routers)
+
+
+def check_tree_indexes(app_configs=None, **kwargs):
+    """
+    Warns about missing indexes for the queries of every model registered
+    with a TreeAdmin.
+    """
+    errors = []
+    for model in get_tree_admin_models():
+        if app_configs and model._meta.app_config not in app_configs:
+            continue
+        for fields, reason in get_missing_indexes(model):
+            errors.append(checks.Warning(
+                'No index starting with ({}) for the {}.'.format(
+                    ', '.join(fields),
+                    reason,
+                ),
+                hint='Add {} to a migration of {}.'.format(
+                    get_add_index_operation(model, fields),
+                    model._meta.app_label,
+                ),
+                obj=model,
+                id='treebeard_admin.W001',
+            ))
+    return errors
+
+
+def check_read_database(app_configs=None, **kwargs):
+    """
+    Errors for TreeAdmins reading from a replica without the TreeAdminRouter,
+    their reads would silently stay on the default database.
+    """
+    if has_tree_router():
+        return []
+    errors = []
+    for model_admin in get_tree_admins():
+        model = model_admin.model
+        if app_configs and model._meta.app_config not in app_configs:
+            continue
+        using = model_admin.read_database or get_read_alias()
+        if not using:
+            continue
+        errors.append(checks.Error(
+            "Tree reads of {} are sent to '{}' but the TreeAdminRouter is "
+            "not installed.".format(model._meta.label, using),
+            hint="Add 'treebeard_admin.routers.TreeAdminRouter' to "
+                 "DATABASE_ROUTERS.",
+            obj=model_admin.__class__,
+            id='treebeard_admin.E001',
+        ))
+    return errors
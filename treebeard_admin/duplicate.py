@@ -0,0 +1,255 @@
+from __future__ import unicode_literals
+
+from abc import ABCMeta, abstractmethod
+
+from django.db import router, transaction
+from django.db.models import F, Max
+
+from treebeard.mp_tree import MP_Node
+from treebeard.ns_tree import NS_Node
+
+
+class SubtreeDuplicator(metaclass=ABCMeta):
+    """
+    Copies the subtree of node to the last child of parent (or the last root
+    when parent is ``None``). The source is read in ordered chunks, the tree
+    fields of the copies are computed in memory and the copies are inserted
+    with ``bulk_create``, all in one transaction.
+
+    ``copy_node(source, copy)`` may change a copy before it is inserted,
+    ``copy_related(pairs)`` gets every inserted chunk as a list of
+    ``(source, copy)`` with the pk of the copies set, to copy or remap
+    related objects.
+    """
+
+    def __init__(self, node, parent=None, chunk_size=500, copy_node=None,
+                 copy_related=None, using=None):
+        self.model = node.__class__
+        self.node = node
+        self.parent = parent
+        self.chunk_size = chunk_size
+        self.copy_node = copy_node
+        self.copy_related = copy_related
+        self.using = using or router.db_for_write(self.model)
+        self.copied = 0
+
+    def get_queryset(self):
+        return self.model._default_manager.using(self.using)
+
+    def reload(self, node):
+        return self.get_queryset().get(pk=node.pk)
+
+    def run(self):
+        """
+        Duplicate the subtree and return the copy of its root.
+        """
+        if self.parent is not None and (
+            self.parent == self.node or self.parent.is_descendant_of(self.node)
+        ):
+            raise ValueError('A subtree can not be copied into itself')
+        with transaction.atomic(using=self.using):
+            self.prepare()
+            pairs = []
+            for source in self.read_source():
+                pairs.append((source, self.make_copy(source)))
+                if len(pairs) >= self.chunk_size:
+                    self.insert(pairs)
+                    pairs = []
+            self.insert(pairs)
+            self.finish()
+        return self.get_root_copy()
+
+    def make_copy(self, source):
+        copy = self.model(**dict(
+            (f.attname, getattr(source, f.attname))
+            for f in self.model._meta.concrete_fields
+            if not f.primary_key
+        ))
+        self.place(source, copy)
+        if self.copy_node:
+            self.copy_node(source, copy)
+        return copy
+
+    def insert(self, pairs):
+        if not pairs:
+            return
+        self.get_queryset().bulk_create([copy for source, copy in pairs])
+        self.copied += len(pairs)
+        if self.copy_related:
+            # only some backends return the pks from bulk_create
+            if pairs[0][1].pk is None:
+                self.load_pks(pairs)
+            self.copy_related(pairs)
+
+    @abstractmethod
+    def prepare(self):
+        """
+        Reload node and parent and compute the position of the root copy.
+        """
+
+    @abstractmethod
+    def read_source(self):
+        """
+        Yield the nodes of the subtree in tree order.
+        """
+
+    @abstractmethod
+    def place(self, source, copy):
+        """
+        Set the tree fields of copy.
+        """
+
+    @abstractmethod
+    def load_pks(self, pairs):
+        """
+        Set the pks of inserted copies the backend did not return.
+        """
+
+    def finish(self):
+        pass
+
+    @abstractmethod
+    def get_root_copy(self):
+        """
+        Return the inserted copy of node.
+        """
+
+
+class MPSubtreeDuplicator(SubtreeDuplicator):
+
+    def prepare(self):
+        self.node = self.reload(self.node)
+        if self.parent is None:
+            qs = self.get_queryset().filter(depth=1)
+            self.root_depth = 1
+            parent_path = ''
+        else:
+            self.parent = self.reload(self.parent)
+            self.root_depth = self.parent.depth + 1
+            parent_path = self.parent.path
+            qs = self.get_queryset().filter(
+                path__startswith=parent_path,
+                depth=self.root_depth,
+            )
+        last = qs.order_by('-path').first()
+        if last is None:
+            self.root_path = self.model._get_path(
+                parent_path, self.root_depth, 1
+            )
+        else:
+            self.root_path = last._inc_path()
+
+    def read_source(self):
+        qs = self.get_queryset().filter(path__startswith=self.node.path)
+        qs = qs.order_by('path')
+        last = None
+        while True:
+            chunk = qs if last is None else qs.filter(path__gt=last)
+            nodes = list(chunk[:self.chunk_size])
+            if not nodes:
+                break
+            for node in nodes:
+                yield node
+            last = nodes[-1].path
+
+    def place(self, source, copy):
+        copy.path = self.root_path + source.path[len(self.node.path):]
+        copy.depth = self.root_depth + source.depth - self.node.depth
+
+    def load_pks(self, pairs):
+        pks = dict(self.get_queryset().filter(
+            path__in=[copy.path for source, copy in pairs]
+        ).values_list('path', 'pk'))
+        for source, copy in pairs:
+            copy.pk = pks[copy.path]
+
+    def finish(self):
+        if self.parent is not None:
+            self.get_queryset().filter(pk=self.parent.pk).update(
+                numchild=F('numchild') + 1
+            )
+
+    def get_root_copy(self):
+        return self.get_queryset().get(path=self.root_path)
+
+
+class NSSubtreeDuplicator(SubtreeDuplicator):
+
+    def prepare(self):
+        node = self.reload(self.node)
+        width = node.rgt - node.lft + 1
+        qs = self.get_queryset()
+        if self.parent is None:
+            max_tree_id = qs.aggregate(max=Max('tree_id'))['max'] or 0
+            self.tree_id = max_tree_id + 1
+            self.root_lft = 1
+            self.root_depth = 1
+        else:
+            # open a gap in front of the right boundary of parent
+            parent = self.reload(self.parent)
+            qs = qs.filter(tree_id=parent.tree_id)
+            qs.filter(rgt__gte=parent.rgt).update(rgt=F('rgt') + width)
+            qs.filter(lft__gt=parent.rgt).update(lft=F('lft') + width)
+            self.tree_id = parent.tree_id
+            self.root_lft = parent.rgt
+            self.root_depth = parent.depth + 1
+            node = self.reload(node)
+        self.node = node
+
+    def read_source(self):
+        qs = self.get_queryset().filter(
+            tree_id=self.node.tree_id,
+            lft__gte=self.node.lft,
+            lft__lte=self.node.rgt,
+        ).order_by('lft')
+        last = None
+        while True:
+            chunk = qs if last is None else qs.filter(lft__gt=last)
+            nodes = list(chunk[:self.chunk_size])
+            if not nodes:
+                break
+            for node in nodes:
+                yield node
+            last = nodes[-1].lft
+
+    def place(self, source, copy):
+        offset = self.root_lft - self.node.lft
+        copy.tree_id = self.tree_id
+        copy.lft = source.lft + offset
+        copy.rgt = source.rgt + offset
+        copy.depth = self.root_depth + source.depth - self.node.depth
+
+    def load_pks(self, pairs):
+        pks = dict(self.get_queryset().filter(
+            tree_id=self.tree_id,
+            lft__in=[copy.lft for source, copy in pairs]
+        ).values_list('lft', 'pk'))
+        for source, copy in pairs:
+            copy.pk = pks[copy.lft]
+
+    def get_root_copy(self):
+        return self.get_queryset().get(tree_id=self.tree_id, lft=self.root_lft)
+
+
+def duplicate_subtree(node, parent=None, **kwargs):
+    """
+    Copy the subtree of node to the last child of parent and return the
+    copy of node, see SubtreeDuplicator for the options. Callers outside of
+    the TreeAdmin bump the tree version with ``bump_tree_version``. Trees
+    with ``node_order_by`` are not supported, the copies would break their
+    sort order.
+    """
+    if node.node_order_by:
+        raise ValueError(
+            '{} trees are sorted by node_order_by and can not be '
+            'duplicated'.format(node._meta.label)
+        )
+    if isinstance(node, MP_Node):
+        duplicator = MPSubtreeDuplicator(node, parent, **kwargs)
+    elif isinstance(node, NS_Node):
+        duplicator = NSSubtreeDuplicator(node, parent, **kwargs)
+    else:
+        raise ValueError(
+            '{} trees can not be duplicated'.format(node._meta.label)
+        )
+    return duplicator.run()
@@ -0,0 +1,424 @@
+from __future__ import unicode_literals
+
+import time
+from abc import ABCMeta, abstractmethod
+from collections import namedtuple
+
+from django.db import router, transaction
+from django.db.models import Case, Count, F, Max, Q, Value, When
+
+from treebeard.al_tree import AL_Node
+from treebeard.mp_tree import MP_Node
+from treebeard.ns_tree import NS_Node
+
+
+TreeProblem = namedtuple('TreeProblem', ['pk', 'kind', 'message'])
+
+
+class TreeChecker(metaclass=ABCMeta):
+    """
+    Streams a tree in keyset ordered chunks and reports (and optionally
+    repairs) inconsistencies. Memory use is bounded by ``chunk_size`` and
+    the depth of the tree, not by the number of nodes.
+    """
+
+    def __init__(self, model, chunk_size=1000, repair=False, dry_run=False,
+                 using=None, report=None, progress=None, max_lock=None):
+        self.model = model
+        self.chunk_size = chunk_size
+        self.repair = repair
+        self.dry_run = dry_run
+        self.max_lock = max_lock
+        self.using = using or router.db_for_write(model)
+        self.report = report
+        self.progress = progress
+        self.checked = 0
+        self.repaired = 0
+        self.unrepaired = 0
+        self.problems = {}
+        self.started = None
+        self.finished = None
+
+    @property
+    def writes(self):
+        return self.repair and not self.dry_run
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0
+        return (self.finished or time.time()) - self.started
+
+    @property
+    def rate(self):
+        elapsed = self.elapsed
+        return self.checked / elapsed if elapsed else 0
+
+    @property
+    def is_valid(self):
+        return not self.problems
+
+    def get_queryset(self):
+        return self.model._default_manager.using(self.using)
+
+    def add_problem(self, pk, kind, message):
+        self.problems[kind] = self.problems.get(kind, 0) + 1
+        if self.report:
+            self.report(TreeProblem(pk, kind, message))
+
+    def chunk_done(self, count):
+        self.checked += count
+        if self.progress:
+            self.progress(self)
+
+    def run(self):
+        self.started = time.time()
+        self.scan()
+        self.finished = time.time()
+        return self
+
+    @abstractmethod
+    def scan(self):
+        """
+        Walk the whole tree, calling add_problem and chunk_done.
+        """
+
+
+class MPTreeChecker(TreeChecker):
+    """
+    Checks ``depth`` against the path length, ``numchild`` against the
+    actual children and reports nodes whose parent path does not exist.
+    ``depth`` and ``numchild`` are repaired, orphans are only reported.
+    """
+
+    def scan(self):
+        steplen = self.model.steplen
+        qs = self.get_queryset().order_by('path')
+        fields = ['pk', 'path', 'depth', 'numchild']
+        stack = []
+        self._updates = {}
+        last = None
+        while True:
+            chunk = qs if last is None else qs.filter(path__gt=last)
+            rows = list(chunk.values_list(*fields)[:self.chunk_size])
+            if not rows:
+                break
+            for pk, path, depth, numchild in rows:
+                self.visit(stack, steplen, pk, path, depth, numchild)
+            last = rows[-1][1]
+            self.flush()
+            self.chunk_done(len(rows))
+        while stack:
+            self.leave(stack.pop())
+        self.flush()
+
+    def visit(self, stack, steplen, pk, path, depth, numchild):
+        if not path or len(path) % steplen:
+            self.add_problem(
+                pk, 'path',
+                'path "{}" is not a multiple of {}'.format(path, steplen)
+            )
+        expected_depth = len(path) // steplen
+        if depth != expected_depth:
+            self.add_problem(
+                pk, 'depth',
+                'depth is {}, expected {}'.format(depth, expected_depth)
+            )
+            self.update(pk, 'depth', expected_depth)
+        while stack and not path.startswith(stack[-1][1]):
+            self.leave(stack.pop())
+        parent_path = path[:-steplen]
+        if stack and stack[-1][1] == parent_path:
+            stack[-1][3] += 1
+        elif parent_path:
+            self.add_problem(
+                pk, 'orphan',
+                'parent with path "{}" does not exist'.format(parent_path)
+            )
+        stack.append([pk, path, numchild, 0])
+
+    def leave(self, entry):
+        pk, path, numchild, children = entry
+        if numchild != children:
+            self.add_problem(
+                pk, 'numchild',
+                'numchild is {}, expected {}'.format(numchild, children)
+            )
+            self.update(pk, 'numchild', children)
+
+    def update(self, pk, field, value):
+        if self.repair:
+            self._updates.setdefault((field, value), []).append(pk)
+
+    def flush(self):
+        """
+        Write the pending repairs, one query per field and value.
+        """
+        updates, self._updates = self._updates, {}
+        if not updates:
+            return
+        with transaction.atomic(using=self.using):
+            for (field, value), pks in updates.items():
+                if self.writes:
+                    self.get_queryset().filter(pk__in=pks).update(
+                        **{field: value}
+                    )
+                self.repaired += len(pks)
+
+
+class NSTreeChecker(TreeChecker):
+    """
+    Walks every tree by ``lft`` and recomputes gap free intervals and depths
+    from the nesting found.
+
+    While the old boundaries of a tree are in order, as with the gaps left
+    by deletes, the repairs are range shifts and depth updates committed
+    per chunk and the tree is a valid nested set after every commit.
+    Overlapping intervals can only be rewritten in one transaction, every
+    state in between mixes old and new intervals, so trees with more than
+    ``max_lock`` nodes are left unrepaired. Trees with more than one root
+    are only reported.
+    """
+
+    def scan(self):
+        qs = self.get_queryset()
+        tree_id = None
+        while True:
+            trees = qs.order_by('tree_id').values_list('tree_id', flat=True)
+            if tree_id is not None:
+                trees = trees.filter(tree_id__gt=tree_id)
+            tree_id = trees.first()
+            if tree_id is None:
+                break
+            self.scan_tree(qs.filter(tree_id=tree_id))
+
+    def walk(self, qs):
+        """
+        Yield ``('lft', entry)`` when a node is entered, ``('rgt', entry)``
+        when it is left and ``('chunk', count)`` after every chunk read.
+        entry is ``[pk, lft, rgt, depth, new_lft, new_depth]``, extended by
+        ``new_rgt`` when the node is left.
+        """
+        # pk breaks ties between broken nodes sharing the same lft
+        qs = qs.order_by('lft', 'pk')
+        fields = ['pk', 'lft', 'rgt', 'depth']
+        boundary = 0
+        stack = []
+        last = None
+        while True:
+            chunk = qs
+            if last is not None:
+                chunk = qs.filter(
+                    Q(lft__gt=last[1]) | Q(lft=last[1], pk__gt=last[0])
+                )
+            rows = list(chunk.values_list(*fields)[:self.chunk_size])
+            if not rows:
+                break
+            for pk, lft, rgt, depth in rows:
+                while stack and lft > stack[-1][2]:
+                    boundary += 1
+                    yield 'rgt', stack.pop() + [boundary]
+                boundary += 1
+                entry = [pk, lft, rgt, depth, boundary, len(stack) + 1]
+                stack.append(entry)
+                yield 'lft', entry
+            last = rows[-1]
+            yield 'chunk', len(rows)
+        while stack:
+            boundary += 1
+            yield 'rgt', stack.pop() + [boundary]
+        yield 'chunk', 0
+
+    def scan_tree(self, qs):
+        root_rgt = qs.order_by('lft', 'pk').values_list(
+            'rgt', flat=True
+        ).first()
+        # nodes past the interval of the first root belong to another root,
+        # there is no single tree to repair them into
+        roots = qs.filter(lft__gt=root_rgt).exists()
+        repair = self.repair and not roots
+        self._shifts = []
+        self._depths = {}
+        ordered = True
+        previous = 0
+        repaired = 0
+        for kind, entry in self.walk(qs):
+            if kind == 'chunk':
+                if repair and ordered and not self.dry_run:
+                    self.flush(qs)
+                self._shifts, self._depths = [], {}
+                if entry:
+                    self.chunk_done(entry)
+                continue
+            pk, lft, rgt, depth, new_lft, new_depth = entry[:6]
+            if kind == 'lft':
+                old, new = lft, new_lft
+                if new_depth == 1 and new_lft > 1:
+                    self.add_problem(
+                        pk, 'root', 'second root node in the same tree'
+                    )
+                if depth != new_depth:
+                    self.add_problem(
+                        pk, 'depth',
+                        'depth is {}, expected {}'.format(depth, new_depth)
+                    )
+                    self._depths.setdefault(new_depth, []).append(pk)
+            else:
+                new_rgt = entry[6]
+                old, new = rgt, new_rgt
+                if (lft, rgt) != (new_lft, new_rgt):
+                    self.add_problem(
+                        pk, 'interval',
+                        'interval is {}-{}, expected {}-{}'.format(
+                            lft, rgt, new_lft, new_rgt
+                        )
+                    )
+                if (lft, rgt, depth) != (new_lft, new_rgt, new_depth):
+                    repaired += 1
+            if old <= previous:
+                ordered = False
+            previous = old
+            self.shift(old, new)
+        if not repair:
+            if self.repair:
+                self.unrepaired += 1
+            return
+        if not ordered and not self.dry_run and not self.rewrite(qs):
+            self.unrepaired += 1
+            return
+        self.repaired += repaired
+
+    def shift(self, old, new):
+        """
+        Add a boundary to the runs of boundaries moved by the same amount.
+        """
+        shifts = self._shifts
+        if shifts and shifts[-1][2] == old - new:
+            shifts[-1][1] = old
+        else:
+            shifts.append([old, old, old - new])
+
+    def flush(self, qs):
+        """
+        Write the shifts and depths of a chunk, one query per run and depth.
+        Boundaries only move down into the already repaired range, so no
+        boundary of a later run or chunk is touched.
+        """
+        with transaction.atomic(using=self.using):
+            for low, high, shift in self._shifts:
+                if not shift:
+                    continue
+                qs.filter(lft__gte=low, lft__lte=high).update(
+                    lft=F('lft') - shift
+                )
+                qs.filter(rgt__gte=low, rgt__lte=high).update(
+                    rgt=F('rgt') - shift
+                )
+            for depth, pks in self._depths.items():
+                qs.filter(pk__in=pks).update(depth=depth)
+
+    def rewrite(self, qs):
+        """
+        Rewrite a tree with overlapping intervals in one transaction, one
+        update per chunk. Returns ``False`` for trees above ``max_lock``.
+        """
+        if self.max_lock and qs.count() > self.max_lock:
+            return False
+        bounds = qs.aggregate(lft=Max('lft'), rgt=Max('rgt'))
+        # rewritten intervals are written above this offset while the tree
+        # is walked so they can not show up again in a later chunk
+        offset = max(bounds['lft'], bounds['rgt']) + 1
+        updates = []
+        with transaction.atomic(using=self.using):
+            for kind, entry in self.walk(qs.filter(lft__lt=offset)):
+                if kind == 'chunk':
+                    self.write(qs, updates)
+                    updates = []
+                    continue
+                if kind == 'lft':
+                    continue
+                pk, lft, rgt, depth, new_lft, new_depth, new_rgt = entry
+                if (lft, rgt) != (new_lft, new_rgt):
+                    updates.append(
+                        (pk, new_lft + offset, new_rgt + offset, new_depth)
+                    )
+                elif depth != new_depth:
+                    updates.append((pk, lft, rgt, new_depth))
+            qs.filter(lft__gte=offset).update(
+                lft=F('lft') - offset,
+                rgt=F('rgt') - offset,
+            )
+        return True
+
+    def write(self, qs, updates):
+        if not updates:
+            return
+        values = {}
+        for i, name in enumerate(['lft', 'rgt', 'depth'], 1):
+            values[name] = Case(
+                *[When(pk=update[0], then=Value(update[i]))
+                  for update in updates],
+                output_field=self.model._meta.get_field(name)
+            )
+        qs.filter(pk__in=[update[0] for update in updates]).update(**values)
+
+
+class ALTreeChecker(TreeChecker):
+    """
+    Walks an adjacency list tree level by level from the roots and reports
+    nodes that can not be reached from a root (parent cycles) and siblings
+    sharing a ``sib_order``. Memory use is bounded by the widest level.
+    Nothing is repaired.
+    """
+
+    def scan(self):
+        qs = self.get_queryset().order_by()
+        total = qs.count()
+        reached = 0
+        level = list(
+            qs.filter(parent__isnull=True).values_list('pk', flat=True)
+        )
+        while level:
+            reached += len(level)
+            self.chunk_done(len(level))
+            children = []
+            for i in range(0, len(level), self.chunk_size):
+                children.extend(qs.filter(
+                    parent__in=level[i:i + self.chunk_size]
+                ).values_list('pk', flat=True))
+            level = children
+        if reached != total:
+            self.add_problem(
+                None, 'cycle',
+                '{} nodes can not be reached from a root'.format(
+                    total - reached
+                )
+            )
+        if not self.model.node_order_by:
+            self.check_sib_order(qs)
+
+    def check_sib_order(self, qs):
+        duplicates = qs.values('parent').annotate(
+            nodes=Count('pk'),
+            orders=Count('sib_order', distinct=True),
+        ).filter(nodes__gt=F('orders'))
+        for row in duplicates:
+            self.add_problem(
+                row['parent'], 'sib_order',
+                '{} children share {} sib_order values'.format(
+                    row['nodes'], row['orders']
+                )
+            )
+
+
+def get_tree_checker(model, **kwargs):
+    """
+    Returns the checker matching the tree implementation of model.
+    """
+    if issubclass(model, MP_Node):
+        return MPTreeChecker(model, **kwargs)
+    if issubclass(model, NS_Node):
+        return NSTreeChecker(model, **kwargs)
+    if issubclass(model, AL_Node):
+        return ALTreeChecker(model, **kwargs)
+    raise ValueError('{} is not a treebeard model'.format(model._meta.label))
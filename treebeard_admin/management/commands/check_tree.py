@@ -0,0 +1,140 @@
+from __future__ import unicode_literals
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from treebeard_admin.checks import get_tree_admin_models
+from treebeard_admin.integrity import get_tree_checker
+from treebeard_admin.models import bump_tree_version
+
+
+class Command(BaseCommand):
+    help = (
+        'Checks treebeard trees for wrong depth, numchild and intervals in '
+        'chunks and optionally repairs them. Adjacency list trees are '
+        'checked for parent cycles and sib_order duplicates only.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'models',
+            nargs='*',
+            metavar='app_label.ModelName',
+            help='Models to check, defaults to all models registered with '
+                 'a TreeAdmin.',
+        )
+        parser.add_argument(
+            '--repair',
+            action='store_true',
+            help='Repair the inconsistencies found.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='With --repair, count the repairs without writing them.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Number of nodes read per query (default 1000).',
+        )
+        parser.add_argument(
+            '--max-lock',
+            type=int,
+            default=100000,
+            help='Largest nested set tree with overlapping intervals '
+                 'rewritten in one transaction, larger ones are left '
+                 'unrepaired (default 100000, 0 for no limit).',
+        )
+        parser.add_argument(
+            '--database',
+            default=None,
+            help='Database alias to use, defaults to the router choice.',
+        )
+
+    def get_models(self, labels):
+        if not labels:
+            return get_tree_admin_models()
+        models = []
+        for label in labels:
+            try:
+                models.append(apps.get_model(label))
+            except (LookupError, ValueError) as e:
+                raise CommandError(e)
+        return models
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be a positive number')
+        verbosity = options['verbosity']
+        invalid = False
+        unrepaired = False
+        for model in self.get_models(options['models']):
+            try:
+                checker = get_tree_checker(
+                    model,
+                    chunk_size=options['chunk_size'],
+                    repair=options['repair'],
+                    dry_run=options['dry_run'],
+                    max_lock=options['max_lock'],
+                    using=options['database'],
+                    report=self.report if verbosity > 1 else None,
+                    progress=self.progress if verbosity > 2 else None,
+                )
+            except ValueError as e:
+                if verbosity:
+                    self.stderr.write(str(e))
+                continue
+            checker.run()
+            if checker.writes and (checker.repaired or checker.unrepaired):
+                bump_tree_version(model, using=checker.using)
+            if not checker.is_valid:
+                invalid = True
+            if checker.unrepaired:
+                unrepaired = True
+            if verbosity:
+                self.summary(model, checker)
+        if invalid and not options['repair']:
+            raise CommandError('Inconsistent trees found')
+        if unrepaired:
+            raise CommandError('Inconsistent trees left unrepaired')
+
+    def report(self, problem):
+        self.stdout.write('  {}: {} ({})'.format(
+            problem.pk,
+            problem.message,
+            problem.kind,
+        ))
+
+    def progress(self, checker):
+        self.stdout.write('  {} nodes checked, {:.0f} nodes/s'.format(
+            checker.checked,
+            checker.rate,
+        ))
+
+    def summary(self, model, checker):
+        if checker.is_valid:
+            status = self.style.SUCCESS('ok')
+        else:
+            status = self.style.ERROR(', '.join(
+                '{} {}'.format(count, kind)
+                for kind, count in sorted(checker.problems.items())
+            ))
+        line = '{}: {} nodes in {:.2f}s ({:.0f} nodes/s), {}'
+        self.stdout.write(line.format(
+            model._meta.label,
+            checker.checked,
+            checker.elapsed,
+            checker.rate,
+            status,
+        ))
+        if checker.repair:
+            self.stdout.write('  {} nodes {}'.format(
+                checker.repaired,
+                'to repair' if checker.dry_run else 'repaired',
+            ))
+        if checker.unrepaired:
+            self.stdout.write(self.style.WARNING(
+                '  {} trees left unrepaired'.format(checker.unrepaired)
+            ))
@@ -0,0 +1,101 @@
+from __future__ import unicode_literals
+
+import re
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router
+
+from treebeard.al_tree import AL_Node
+
+from treebeard_admin.checks import (
+    get_add_index_operation,
+    get_missing_indexes,
+    get_tree_admin_models,
+)
+
+
+# plan lines of sqlite, postgresql and mysql reading a whole table or index
+FULL_SCAN = re.compile(r'\bSCAN\b|\bSeq Scan\b|\bALL\b')
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs EXPLAIN for the queries of TreeAdmin changelists, dropdowns '
+        'and moves and suggests the indexes missing for them.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'models',
+            nargs='*',
+            metavar='app_label.ModelName',
+            help='Models to explain, defaults to all models registered with '
+                 'a TreeAdmin.',
+        )
+        parser.add_argument(
+            '--database',
+            default=None,
+            help='Database alias to use, defaults to the router choice.',
+        )
+
+    def get_models(self, labels):
+        if not labels:
+            return get_tree_admin_models()
+        try:
+            return [apps.get_model(label) for label in labels]
+        except (LookupError, ValueError) as e:
+            raise CommandError(e)
+
+    def get_queries(self, model, using):
+        qs = model._default_manager.using(using)
+        if issubclass(model, AL_Node):
+            roots = qs.filter(parent__isnull=True)
+            node = roots.first()
+            queries = [('root changelist', roots, False)]
+            if node is not None:
+                queries += [
+                    ('children', qs.filter(parent=node), False),
+                    ('siblings', qs.filter(parent=node.parent), False),
+                ]
+            return queries
+        roots = qs.filter(depth=1)
+        node = roots.first()
+        queries = [
+            ('root changelist', roots, False),
+            ('dropdown tree', model.get_tree().using(using), True),
+        ]
+        if node is not None:
+            queries += [
+                ('children', node.get_children().using(using), False),
+                ('descendants', node.get_descendants().using(using), False),
+                ('siblings', node.get_siblings().using(using), False),
+            ]
+        return queries
+
+    def handle(self, *args, **options):
+        for model in self.get_models(options['models']):
+            using = options['database'] or router.db_for_read(model)
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                '{} ({})'.format(model._meta.label, using)
+            ))
+            for name, qs, expected in self.get_queries(model, using):
+                plan = qs.explain()
+                if not FULL_SCAN.search(plan):
+                    status = 'ok'
+                elif expected:
+                    status = 'full scan (expected)'
+                else:
+                    status = self.style.WARNING('full scan')
+                self.stdout.write('  {}: {}'.format(name, status))
+                if options['verbosity'] > 1:
+                    for line in plan.splitlines():
+                        self.stdout.write('    {}'.format(line))
+            for fields, reason in get_missing_indexes(model):
+                self.stdout.write('  missing index ({}) for the {}:'.format(
+                    ', '.join(fields),
+                    reason,
+                ))
+                self.stdout.write('    {}'.format(
+                    get_add_index_operation(model, fields)
+                ))
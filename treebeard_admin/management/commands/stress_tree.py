@@ -0,0 +1,115 @@
+from __future__ import unicode_literals
+
+import json
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from treebeard_admin.stress import OPERATIONS, StressRunner
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs random TreeAdmin moves, adds and deletes from concurrent '
+        'workers against the configured database, reports throughput and '
+        'latency percentiles and checks the tree afterwards. It writes to '
+        'the tree, never run it against production data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'model',
+            metavar='app_label.ModelName',
+            help='Tree model to stress.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Number of concurrent workers (default 4).',
+        )
+        parser.add_argument(
+            '--processes',
+            action='store_true',
+            help='Run the workers as processes instead of threads.',
+        )
+        parser.add_argument(
+            '--operations',
+            type=int,
+            default=100,
+            help='Operations per worker (default 100).',
+        )
+        parser.add_argument(
+            '--populate',
+            type=int,
+            default=0,
+            help='Nodes to add with add_child before the measurement.',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Seed of the random operations.',
+        )
+        for op in OPERATIONS:
+            parser.add_argument(
+                '--{}-weight'.format(op),
+                type=int,
+                dest='{}_weight'.format(op),
+                default={'move': 3, 'add': 2, 'delete': 1}[op],
+                help='Relative weight of {} operations.'.format(op),
+            )
+        parser.add_argument(
+            '--data',
+            default='{}',
+            help='JSON object with field values for added nodes.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            model = apps.get_model(options['model'])
+            data = json.loads(options['data'])
+        except (LookupError, ValueError) as e:
+            raise CommandError(e)
+        runner = StressRunner(
+            model,
+            workers=options['workers'],
+            operations=options['operations'],
+            seed=options['seed'],
+            weights=dict(
+                (op, options['{}_weight'.format(op)]) for op in OPERATIONS
+            ),
+            data=data,
+            processes=options['processes'],
+        )
+        if options['populate']:
+            runner.populate(options['populate'])
+        runner.run()
+        self.stdout.write('{} workers ({}), {:.2f}s'.format(
+            runner.workers,
+            'processes' if runner.processes else 'threads',
+            runner.elapsed,
+        ))
+        self.stdout.write(
+            '{:<8}{:>7}{:>7}{:>7}{:>9}{:>9}{:>9}{:>9}{:>9}'.format(
+                'op', 'count', 'done', 'errors', 'ops/s',
+                'p50 ms', 'p90 ms', 'p99 ms', 'max ms',
+            )
+        )
+        for op, stats in sorted(runner.summary().items()):
+            self.stdout.write(
+                '{:<8}{count:>7}{done:>7}{errors:>7}{per_second:>9.1f}'
+                '{p50:>9.1f}{p90:>9.1f}{p99:>9.1f}{max:>9.1f}'.format(
+                    op, **stats
+                )
+            )
+        for error, count in sorted(runner.errors().items()):
+            self.stdout.write('  {}x {}'.format(count, error))
+        checker = runner.check()
+        if checker.is_valid:
+            self.stdout.write(self.style.SUCCESS('Tree is consistent'))
+        else:
+            raise CommandError('Tree is inconsistent: {}'.format(', '.join(
+                '{} {}'.format(count, kind)
+                for kind, count in sorted(checker.problems.items())
+            )))
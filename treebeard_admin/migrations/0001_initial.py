@@ -0,0 +1,26 @@
+# Generated by Django 2.2.28 on 2026-10-19 18:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TreeVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('label', models.CharField(max_length=255, unique=True, verbose_name='model')),
+                ('version', models.PositiveIntegerField(default=0, verbose_name='version')),
+            ],
+            options={
+                'verbose_name': 'tree version',
+                'verbose_name_plural': 'tree versions',
+            },
+        ),
+    ]
@@ -0,0 +1,90 @@
+from __future__ import unicode_literals
+
+from django.db import connections, models, router, transaction
+from django.db.models import F
+from django.utils.translation import ugettext_lazy as _
+
+
+class TreeVersion(models.Model):
+    """
+    Counter bumped on every structural change of a tree, used to tell if a
+    read replica has caught up with the primary database.
+    """
+
+    label = models.CharField(
+        _('model'),
+        max_length=255,
+        unique=True,
+    )
+    version = models.PositiveIntegerField(
+        _('version'),
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = _('tree version')
+        verbose_name_plural = _('tree versions')
+
+    def __str__(self):
+        return '{} ({})'.format(self.label, self.version)
+
+    @classmethod
+    def get_version(cls, model, using=None):
+        qs = cls.objects.using(using).filter(label=model._meta.label_lower)
+        return qs.values_list('version', flat=True).first() or 0
+
+    @classmethod
+    def bump(cls, model, using=None):
+        """
+        Increment the version of the model tree and return the new version.
+        """
+        label = model._meta.label_lower
+        qs = cls.objects.using(using).filter(label=label)
+        if not qs.update(version=F('version') + 1):
+            cls.objects.using(using).get_or_create(label=label)
+            qs.update(version=F('version') + 1)
+        return qs.values_list('version', flat=True).get()
+
+
+class _PendingBump(object):
+    """
+    on_commit callback bumping the version of one tree, shared by every
+    bump_tree_version call within the same transaction.
+    """
+
+    def __init__(self, model, using):
+        self.model = model
+        self.using = using
+        self.callbacks = []
+
+    def __call__(self):
+        version = TreeVersion.bump(self.model, using=self.using)
+        for callback in self.callbacks:
+            callback(version)
+
+
+def bump_tree_version(model, using=None, callback=None):
+    """
+    Bump the version of the model tree, call this after changing a tree
+    outside of the TreeAdmin (scripts, ``node.move()``, ``load_bulk``) so
+    cached trees and pinned replica reads see the change.
+
+    Within a transaction the bump is deferred until the commit and done at
+    most once per tree. callback gets the new version.
+    """
+    using = using or router.db_for_write(model)
+    connection = connections[using]
+    if not connection.in_atomic_block:
+        version = TreeVersion.bump(model, using=using)
+        if callback:
+            callback(version)
+        return
+    for entry in connection.run_on_commit:
+        if isinstance(entry[1], _PendingBump) and entry[1].model is model:
+            bump = entry[1]
+            break
+    else:
+        bump = _PendingBump(model, using)
+        transaction.on_commit(bump, using=using)
+    if callback:
+        bump.callbacks.append(callback)
@@ -0,0 +1,130 @@
+from __future__ import unicode_literals
+
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from treebeard.models import Node
+
+from .models import TreeVersion
+
+
+SESSION_KEY = '_treebeard_admin_versions'
+
+_local = threading.local()
+
+
+def get_read_alias():
+    """
+    Alias of the read replica, ``TREEBEARD_ADMIN_READ_DATABASE``.
+    """
+    return getattr(settings, 'TREEBEARD_ADMIN_READ_DATABASE', None)
+
+
+def get_write_alias():
+    """
+    Alias of the primary database, ``TREEBEARD_ADMIN_WRITE_DATABASE``.
+    """
+    return getattr(
+        settings,
+        'TREEBEARD_ADMIN_WRITE_DATABASE',
+        DEFAULT_DB_ALIAS
+    )
+
+
+@contextmanager
+def read_from(model, using):
+    """
+    Route the reads of model to using for the current thread.
+    """
+    aliases = getattr(_local, 'aliases', {})
+    _local.aliases = dict(aliases, **{model._meta.label_lower: using})
+    try:
+        yield
+    finally:
+        _local.aliases = aliases
+
+
+def tree_reads(view):
+    """
+    Decorator for TreeAdmin views, runs the view and renders its response
+    with the reads of the tree routed to the database returned by
+    ``get_read_database``.
+    """
+    @wraps(view)
+    def inner(self, request, *args, **kwargs):
+        using = self.get_read_database(request)
+        if using is None:
+            return view(self, request, *args, **kwargs)
+        with read_from(self.model, using):
+            response = view(self, request, *args, **kwargs)
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+        return response
+    return inner
+
+
+def pin_version(request, model, version):
+    """
+    Remember the tree version written by the user of request, reads stay on
+    the primary database until the replica has this version.
+    """
+    session = getattr(request, 'session', None)
+    if session is not None:
+        versions = session.get(SESSION_KEY, {})
+        versions[model._meta.label_lower] = version
+        session[SESSION_KEY] = versions
+
+
+def is_replica_current(request, model, using):
+    """
+    Whether the replica using has every tree change made by the user of
+    request, drops the pinned version once it has.
+    """
+    session = getattr(request, 'session', None)
+    if session is None:
+        return True
+    label = model._meta.label_lower
+    versions = session.get(SESSION_KEY, {})
+    if label not in versions:
+        return True
+    if TreeVersion.get_version(model, using=using) < versions[label]:
+        return False
+    del versions[label]
+    session[SESSION_KEY] = versions
+    return True
+
+
+class TreeAdminRouter(object):
+    """
+    Sends tree reads to the replica while a TreeAdmin view routes them and
+    all tree writes to the primary database. The router is required for
+    ``TREEBEARD_ADMIN_READ_DATABASE`` and ``TreeAdmin.read_database``, the
+    check ``treebeard_admin.E001`` fails without it. Enable it with::
+
+        DATABASE_ROUTERS = ['treebeard_admin.routers.TreeAdminRouter']
+        TREEBEARD_ADMIN_READ_DATABASE = 'replica'
+    """
+
+    def _is_tree_model(self, model):
+        return issubclass(model, (Node, TreeVersion))
+
+    def db_for_read(self, model, **hints):
+        aliases = getattr(_local, 'aliases', None)
+        if aliases:
+            return aliases.get(model._meta.label_lower)
+        return None
+
+    def db_for_write(self, model, **hints):
+        if self._is_tree_model(model):
+            return get_write_alias()
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = (get_read_alias(), get_write_alias())
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
@@ -0,0 +1,299 @@
+from __future__ import unicode_literals
+
+import multiprocessing
+import random
+import string
+import threading
+import time
+
+from django import forms
+from django.apps import apps
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.db import connections, router, transaction
+from django.db.models import Max, Min
+from django.test import RequestFactory
+
+from .admin import TreeAdmin
+from .integrity import get_tree_checker
+from .models import bump_tree_version
+
+
+OPERATIONS = ('move', 'add', 'delete')
+
+
+class StressRunner(object):
+    """
+    Fires random ``update_view`` moves, ``TreeAdminForm`` adds and
+    deletes against the configured database from several threads or
+    processes and collects the latency of every operation. Adds and
+    deletes run in a transaction like ``changeform_view`` and
+    ``delete_view`` do.
+
+    Every worker draws its operations from ``random.Random(seed + n)``, so
+    the sequence of operations is reproducible, their interleaving is not.
+    """
+
+    def __init__(self, model, workers=4, operations=100, seed=0,
+                 weights=None, data=None, processes=False, username=None):
+        self.model = model
+        self.workers = workers
+        self.operations = operations
+        self.seed = seed
+        self.weights = weights or {'move': 3, 'add': 2, 'delete': 1}
+        self.data = data or {}
+        self.processes = processes
+        self.username = username or 'treebeard-admin-stress'
+        self.model_admin = admin.site._registry.get(model)
+        if not isinstance(self.model_admin, TreeAdmin):
+            self.model_admin = TreeAdmin(model, admin.site)
+        self.factory = RequestFactory()
+        self.results = []
+        self.elapsed = 0
+
+    def get_user(self):
+        user, created = get_user_model()._default_manager.get_or_create(
+            **{get_user_model().USERNAME_FIELD: self.username}
+        )
+        if created or not user.is_superuser:
+            user.is_staff = True
+            user.is_superuser = True
+            user.save()
+        return user
+
+    def populate(self, count, seed=None):
+        """
+        Add count nodes with ``add_child`` and ``add_root``, outside of the
+        measurement.
+        """
+        rnd = random.Random(self.seed if seed is None else seed)
+        request = self.factory.get('/')
+        request.user = self.get_user()
+        Form = self.model_admin.get_form(request)
+        for i in range(count):
+            parent = self.get_random_node(rnd) if rnd.random() < 0.8 else None
+            values = dict(
+                (name, Form.base_fields[name].clean(value))
+                for name, value in self.get_data(rnd, Form).items()
+                if not name.startswith('_')
+            )
+            if parent is None:
+                self.model.add_root(**values)
+            else:
+                parent.add_child(**values)
+        bump_tree_version(self.model)
+
+    def get_data(self, rnd, Form):
+        """
+        Form data for a new node, random values for the required fields
+        not given in data.
+        """
+        data = {}
+        for name, field in Form.base_fields.items():
+            if name.startswith('_') or name in self.data:
+                continue
+            if field.required:
+                data[name] = _random_value(rnd, field)
+        data.update(self.data)
+        return data
+
+    def get_options(self):
+        return {
+            'workers': self.workers,
+            'operations': self.operations,
+            'seed': self.seed,
+            'weights': self.weights,
+            'data': self.data,
+            'username': self.username,
+        }
+
+    def run(self):
+        user = self.get_user()
+        started = time.time()
+        if self.processes:
+            # the forked processes must not share the connections
+            connections.close_all()
+            pool = multiprocessing.Pool(self.workers)
+            try:
+                results = pool.map(_run_worker, [
+                    (self.model._meta.label, self.get_options(), n, user.pk)
+                    for n in range(self.workers)
+                ])
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [None] * self.workers
+
+            def target(n):
+                try:
+                    results[n] = self.run_worker(n, user)
+                finally:
+                    connections.close_all()
+
+            threads = [
+                threading.Thread(target=target, args=(n,))
+                for n in range(self.workers)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.elapsed = time.time() - started
+        self.results = [result for chunk in results for result in chunk or []]
+        return self
+
+    def run_worker(self, n, user):
+        rnd = random.Random(self.seed + n)
+        operations = [op for op in OPERATIONS if self.weights.get(op)]
+        weights = [self.weights[op] for op in operations]
+        results = []
+        for i in range(self.operations):
+            op = _weighted_choice(rnd, operations, weights)
+            started = time.time()
+            try:
+                done = getattr(self, op)(rnd, user)
+                error = None
+            except Exception as e:
+                done = False
+                message = (str(e).splitlines() or [''])[0]
+                error = '{}: {}'.format(e.__class__.__name__, message)
+            results.append((op, time.time() - started, done, error))
+        return results
+
+    def get_random_node(self, rnd):
+        qs = self.model._default_manager.order_by()
+        bounds = qs.aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is None:
+            return None
+        pk = rnd.randint(bounds['low'], bounds['high'])
+        return self.model._default_manager.filter(pk__gte=pk).order_by(
+            'pk'
+        ).first()
+
+    def move(self, rnd, user):
+        node = self.get_random_node(rnd)
+        target = self.get_random_node(rnd)
+        if node is None or target is None or node == target or (
+            target.is_descendant_of(node)
+        ):
+            return False
+        pos = rnd.choice(['left', 'right', 'first', 'last'])
+        data = {
+            'depth': target.get_depth(),
+            'pos': pos,
+            'node': node.pk,
+            'target': target.pk,
+        }
+        if pos in ('first', 'last'):
+            data['parent'] = target.pk
+        request = self.factory.post(
+            '/',
+            data,
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+        request.user = user
+        response = self.model_admin.update_view(request)
+        return response.status_code == 200 and b'"ok"' in response.content
+
+    def add(self, rnd, user):
+        parent = self.get_random_node(rnd) if rnd.random() < 0.8 else None
+        request = self.factory.post('/')
+        request.user = user
+        Form = self.model_admin.get_form(request)
+        data = self.get_data(rnd, Form)
+        data.update({
+            '_parent_id': getattr(parent, 'pk', 0),
+            '_position': rnd.choice(['first-child', 'last-child']),
+        })
+        with transaction.atomic(using=router.db_for_write(self.model)):
+            form = Form(data)
+            if not form.is_valid():
+                raise ValueError(form.errors.as_text())
+            obj = self.model_admin.save_form(request, form, change=False)
+            self.model_admin.save_model(request, obj, form, change=False)
+        return True
+
+    def delete(self, rnd, user):
+        request = self.factory.post('/')
+        request.user = user
+        with transaction.atomic(using=router.db_for_write(self.model)):
+            node = self.get_random_node(rnd)
+            if node is None:
+                return False
+            self.model_admin.delete_model(request, node)
+        return True
+
+    def check(self):
+        return get_tree_checker(self.model).run()
+
+    def summary(self):
+        """
+        Throughput and latency percentiles (in ms) per operation.
+        """
+        stats = {}
+        for op in OPERATIONS + ('all',):
+            results = [
+                r for r in self.results if op == 'all' or r[0] == op
+            ]
+            if not results:
+                continue
+            latencies = sorted(r[1] * 1000 for r in results)
+            stats[op] = {
+                'count': len(results),
+                'done': len([r for r in results if r[2]]),
+                'errors': len([r for r in results if r[3]]),
+                'per_second': len(results) / self.elapsed,
+                'p50': _percentile(latencies, 50),
+                'p90': _percentile(latencies, 90),
+                'p99': _percentile(latencies, 99),
+                'max': latencies[-1],
+            }
+        return stats
+
+    def errors(self):
+        counts = {}
+        for op, latency, done, error in self.results:
+            if error:
+                counts[error] = counts.get(error, 0) + 1
+        return counts
+
+
+def _run_worker(args):
+    label, options, n, user_pk = args
+    runner = StressRunner(apps.get_model(label), **options)
+    user = get_user_model()._default_manager.get(pk=user_pk)
+    try:
+        return runner.run_worker(n, user)
+    finally:
+        connections.close_all()
+
+
+def _weighted_choice(rnd, choices, weights):
+    value = rnd.uniform(0, sum(weights))
+    for choice, weight in zip(choices, weights):
+        value -= weight
+        if value <= 0:
+            return choice
+    return choices[-1]
+
+
+def _percentile(values, percent):
+    index = int(round(percent / 100.0 * (len(values) - 1)))
+    return values[index]
+
+
+def _random_value(rnd, field):
+    if isinstance(field, forms.BooleanField):
+        return rnd.choice([True, False])
+    if isinstance(field, (forms.IntegerField, forms.DecimalField)):
+        return rnd.randint(0, 1000)
+    if isinstance(field, forms.CharField):
+        length = min(field.max_length or 12, 12)
+        return ''.join(rnd.choice(string.ascii_lowercase)
+                       for i in range(length))
+    raise ValueError(
+        'Can not generate a value for {}, pass it in data'.format(
+            field.__class__.__name__
+        )
+    )
@@ -1,7 +1,19 @@
 from __future__ import unicode_literals
 
+import hashlib
+
 from django import template
+from django.apps import apps
 from django.contrib.admin.templatetags.admin_modify import submit_row
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db.models import QuerySet
+from django.utils.encoding import force_bytes
+from django.utils.safestring import mark_safe
+
+from treebeard.models import Node
+
+from ..models import TreeVersion
 
 register = template.Library()
 
@@ -12,3 +24,109 @@ register = template.Library()
 )
 def treebeard_admin_submit_row(context):
     return submit_row(context)
+
+
+@register.simple_tag(takes_context=True)
+def treebeard_admin_tree(context, root, template_name, *vary_on, **options):
+    """
+    Renders the subtree of root from one ordered query, every node with
+    template_name. The node template gets ``node``, ``level`` and the
+    rendered ``children``. root is a node or an ``app_label.ModelName``
+    label for the whole tree.
+
+        {% treebeard_admin_tree menu_root 'menu/node.html' depth=2 %}
+
+    Options are ``depth``, ``include_root``, ``timeout`` and ``cache``
+    (alias). The output is cached per root, tree version and the extra
+    ``vary_on`` arguments, ``timeout=0`` disables caching. Changes made
+    outside of the TreeAdmin need a ``bump_tree_version`` to show up.
+    AL trees are supported but load the children of every node with a
+    query of their own.
+    """
+    depth = options.get('depth')
+    include_root = options.get('include_root', False)
+    timeout = options.get('timeout', DEFAULT_TIMEOUT)
+    if isinstance(root, Node):
+        model = root.__class__
+    else:
+        model, root = apps.get_model(root), None
+    key = None
+    if timeout != 0:
+        cache = caches[options.get('cache', 'default')]
+        key = _make_tree_key(
+            model, root, TreeVersion.get_version(model),
+            [template_name, depth, include_root] + list(vary_on)
+        )
+        html = cache.get(key)
+        if html is not None:
+            return mark_safe(html)
+    html = _render_tree(
+        context,
+        context.template.engine.get_template(template_name),
+        _get_tree_nodes(model, root, depth, include_root),
+    )
+    if key is not None:
+        cache.set(key, html, timeout)
+    return mark_safe(html)
+
+
+def _make_tree_key(model, root, version, vary_on):
+    digest = hashlib.md5()
+    for arg in vary_on:
+        digest.update(force_bytes(arg))
+        digest.update(b':')
+    return 'treebeard_admin.tree.{}.{}.{}.{}'.format(
+        model._meta.label_lower,
+        getattr(root, 'pk', 'all'),
+        version,
+        digest.hexdigest(),
+    )
+
+
+def _get_tree_nodes(model, root, depth, include_root):
+    if root is None:
+        nodes, max_depth = model.get_tree(), depth
+    else:
+        nodes = root.get_descendants()
+        max_depth = depth and root.get_depth() + depth
+    if not max_depth:
+        nodes = list(nodes)
+    elif isinstance(nodes, QuerySet):
+        nodes = list(nodes.filter(depth__lte=max_depth))
+    else:
+        # AL trees come as a list with the depth cached on every node
+        nodes = [node for node in nodes if node.get_depth() <= max_depth]
+    if root is not None and include_root:
+        nodes.insert(0, root)
+    return nodes
+
+
+def _render_tree(context, node_template, nodes):
+    """
+    Renders the nodes (in tree order) bottom up, a node is rendered once all
+    its children are.
+    """
+    if not nodes:
+        return ''
+    base_depth = nodes[0].get_depth()
+    output = []
+    stack = []
+
+    def render(entry):
+        node, children = entry
+        with context.push(
+            node=node,
+            level=node.get_depth() - base_depth + 1,
+            children=mark_safe(''.join(children)),
+        ):
+            html = node_template.render(context)
+        (stack[-1][1] if stack else output).append(html)
+
+    for node in nodes:
+        depth = node.get_depth()
+        while stack and stack[-1][0].get_depth() >= depth:
+            render(stack.pop())
+        stack.append((node, []))
+    while stack:
+        render(stack.pop())
+    return ''.join(output)